@@ -1,58 +1,356 @@
 import streamlit as st
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import seaborn as sns
+import altair as alt
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import os
+import io
+import hashlib
+import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# Define function to load data
-@st.cache_data
-def load_data(region, platform='iOS'):
-    try:
-        # Define the directory where the files are located
-        data_directory = './comb/'
-
-        # Define the file names to look for based on region and platform
-        file_mapping = {
-            'United Arab Emirates': {
-                'iOS': 'uae_iphone_games.csv',
-                'Android': 'uae_android_games.csv'
-            },
-            'Saudi Arabia': {
-                'iOS': 'saudi_iphone_games.csv',
-                'Android': 'saudi_android_games.csv'
-            },
-            'Egypt': {
-                'iOS': 'egypt_iphone_games.csv',
-                'Android': 'egypt_android_games.csv'
-            },
-            'Iraq': {
-                'iOS': 'iraq_iphone_games.csv',
-                'Android': 'iraq_android_games.csv'
-            },
-            'Morocco': {
-                'iOS': 'morocco_iphone_games.csv',
-                'Android': 'morocco_android_games.csv'
-            }
-        }
+# Columns the app actually uses; everything else in the CSV is skipped at parse time
+required_columns = ['Category', 'Game Name', 'Rating', 'Position']
+column_schema = {
+    'Category': pl.Categorical,
+    'Game Name': pl.Utf8,
+    'Rating': pl.Float32,
+    'Position': pl.Float64,  # Read as float so '1.0' parses; narrowed to int32 in compact_dtypes
+}
+
+# pandas' default missing-value markers, so uploads read 'N/A', 'null' etc. as NaN like pd.read_csv did
+na_values = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+# Narrow the hot columns: categorical Category turns ==/isin into int code
+# compares, and a downcast Position halves the bytes copied by head()
+def compact_dtypes(df):
+    df.columns = df.columns.str.strip()  # Strip spaces from column names
+    if 'Category' in df.columns:
+        # Categories in order of first appearance, matching unique() and the same for every source
+        values = df['Category'].astype(object)
+        df['Category'] = pd.Categorical(values, categories=values.dropna().unique())
+    if 'Position' in df.columns:
+        position = df['Position']
+        whole = pd.api.types.is_float_dtype(position) and position.notna().all() and (position % 1 == 0).all()
+        if pd.api.types.is_integer_dtype(position) or whole:
+            df['Position'] = position.astype('int32')
+    return df
+
+# Map each stripped header name to its spelling in the file, so padded headers
+# such as 'Rating ' still match the required columns when projecting
+def header_names(header):
+    return {name.strip(): name for name in header}
+
+# Header of a bundled CSV, read without parsing any rows
+def read_local_header(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return header_names(next(csv.reader(f), []))
+
+# Header of an uploaded CSV, read without parsing any rows
+def read_uploaded_header(data):
+    return header_names(pl.read_csv(io.BytesIO(data), n_rows=0).columns)
+
+# Parse only the required columns of an uploaded CSV in Polars, typed at parse time,
+# then hand pandas a compact frame; the cached pipeline and the charts below stay on pandas
+def read_uploaded_csv(data, names):
+    df = pl.read_csv(
+        io.BytesIO(data),
+        columns=[names[col] for col in required_columns],
+        schema_overrides={names[col]: dtype for col, dtype in column_schema.items()},
+        null_values=na_values,
+    )
+    df.columns = [name.strip() for name in df.columns]
+    return compact_dtypes(df.select(required_columns).to_pandas())
+
+# Parse a bundled CSV straight from a memory map with PyArrow's multithreaded reader,
+# typing the narrow columns at parse time
+def read_local_csv(path, names):
+    table = pacsv.read_csv(
+        pa.memory_map(path, 'r'),
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[names[col] for col in required_columns],
+            column_types={names['Rating']: pa.float32(), names['Position']: pa.int32()},
+        ),
+    )
+    return compact_dtypes(table.to_pandas(types_mapper=pd.ArrowDtype))
+
+# Error message for a header missing any required column, or None when it is complete;
+# checked before projecting so users see this instead of a parser exception
+def missing_columns_error(names):
+    missing = [col for col in required_columns if col not in names]
+    if missing:
+        return f"CSV file does not contain required columns: {', '.join(missing)}."
+    return None
+
+# Define possible categories
+free_categories = ['Top Free Games', 'Free', 'Top Free']
+paid_categories = ['Top Paid Games', 'Paid', 'Top Paid' ]
+grossing_categories = ['Top Grossing Games', 'Grossing', 'Top Grossing']
+
+# Every category name mapped to the chart bucket it feeds
+category_buckets = {
+    **{c: 'free' for c in free_categories},
+    **{c: 'paid' for c in paid_categories},
+    **{c: 'grossing' for c in grossing_categories},
+}
 
+# Chart theme is global matplotlib state, so set it once per server process instead of per chart
+@st.cache_resource
+def init_theme():
+    sns.set_theme(style="darkgrid", palette="viridis")
+    plt.rcParams.update({
+        "axes.facecolor": "#303030",
+        "figure.facecolor": "#303030",
+        "text.color": "white",
+        "axes.labelcolor": "white",
+        "xtick.color": "white",
+        "ytick.color": "white",
+    })
+    return True
+
+init_theme()
+
+# Define the directory where the files are located
+data_directory = './comb/'
+
+# Define the file names to look for based on region and platform
+file_mapping = {
+    'United Arab Emirates': {
+        'iOS': 'uae_iphone_games.csv',
+        'Android': 'uae_android_games.csv'
+    },
+    'Saudi Arabia': {
+        'iOS': 'saudi_iphone_games.csv',
+        'Android': 'saudi_android_games.csv'
+    },
+    'Egypt': {
+        'iOS': 'egypt_iphone_games.csv',
+        'Android': 'egypt_android_games.csv'
+    },
+    'Iraq': {
+        'iOS': 'iraq_iphone_games.csv',
+        'Android': 'iraq_android_games.csv'
+    },
+    'Morocco': {
+        'iOS': 'morocco_iphone_games.csv',
+        'Android': 'morocco_android_games.csv'
+    }
+}
+
+# Read one bundled CSV; returns (df, error message) so it can run off the script thread
+def read_region_file(region, platform):
+    try:
         if region in file_mapping:
             platform_file = file_mapping[region].get(platform)
             if platform_file:
                 selected_file = os.path.join(data_directory, platform_file)
                 if os.path.exists(selected_file):
-                    df = pd.read_csv(selected_file)
-                    df.columns = df.columns.str.strip()  # Strip spaces from column names
-                    return df
+                    names = read_local_header(selected_file)
+                    error = missing_columns_error(names)
+                    if error:
+                        return pd.DataFrame(), error
+                    return read_local_csv(selected_file, names), None
                 else:
-                    st.error(f"File not found: {selected_file}")
-                    return pd.DataFrame()
+                    return pd.DataFrame(), f"File not found: {selected_file}"
 
-        st.error(f"No files found for {region} ({platform}).")
-        return pd.DataFrame()
+        return pd.DataFrame(), f"No files found for {region} ({platform})."
 
     except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return pd.DataFrame()  # Return an empty DataFrame in case of other errors
+        return pd.DataFrame(), f"Error loading data: {e}"  # Return an empty DataFrame in case of other errors
+
+# Parse every bundled region/platform CSV in parallel once per server process;
+# the PyArrow reader releases the GIL, so the threads overlap real parse work
+@st.cache_resource
+def prewarm_data():
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = {
+            (region, platform): executor.submit(read_region_file, region, platform)
+            for region, platforms in file_mapping.items()
+            for platform in platforms
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+# Define function to load data; a lookup into the prewarmed frames
+def load_data(region, platform='iOS'):
+    df, error = prewarm_data().get((region, platform), (pd.DataFrame(), f"No files found for {region} ({platform})."))
+    if error:
+        st.error(error)
+    return df
+
+# Parse an uploaded CSV once per distinct file content; Streamlit hashes the bytes
+@st.cache_data
+def read_uploaded(name, data):
+    try:
+        names = read_uploaded_header(data)
+        error = missing_columns_error(names)
+        if error:
+            st.error(error)
+            return pd.DataFrame()
+        return read_uploaded_csv(data, names)
+    except Exception as e:
+        st.error(f"Error reading {name}: {e}")
+        return pd.DataFrame()
+
+# Derive the category vocabulary and per-category row positions once per dataset;
+# widget reruns reuse them instead of rebuilding boolean masks
+@st.cache_data
+def prepare_data(cache_key, _df):
+    cats = _df['Category']  # Already categorical, see compact_dtypes
+    # One pass over the column yields every category's row positions
+    category_groups = _df.groupby(cats, sort=False, observed=True).indices
+    # Mapping the categorical only touches its categories; rows outside any bucket drop out as NaN
+    buckets = cats.map(category_buckets).astype('category')
+    bucket_groups = _df.groupby(buckets, sort=False, observed=True).indices
+    return category_groups, bucket_groups
+
+# Rows at the given positions, or an empty slice when there are none
+def take_rows(df, rows):
+    return df.take(rows) if rows is not None else df.iloc[0:0]
+
+# Top-N rows of a slice, selected once per (dataset, group, N); group is ('bucket', name)
+# or ('category', name) so a category literally named 'free' never hits a bucket's entry
+@st.cache_data
+def top_by_position(cache_key, group, num_games, _df):
+    return _df.nsmallest(num_games, 'Position')
+
+# Highest-rated games in the dataset, selected once per (dataset, N); a game listed in
+# several categories counts once, at its best rating, so it gets a single bar
+@st.cache_data
+def top_by_rating(cache_key, num_games, _df):
+    best = _df.groupby('Game Name', sort=False, observed=True)['Rating'].max()
+    return best.nlargest(num_games).reset_index()[['Rating', 'Game Name']]
+
+# Content hash for chart inputs (frames or single columns), so identical slices skip re-rendering
+def hash_frame(df):
+    return (df.shape, int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+# Render a figure to PNG bytes
+def figure_to_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', facecolor='#303030')
+    return buf.getvalue()
+
+# One pie figure per server process, cleared and redrawn for each chart instead of
+# allocated per call; it is shared by all sessions, so drawing holds the lock
+@st.cache_resource
+def pie_canvas():
+    fig = Figure(figsize=(8, 8))
+    return fig, fig.subplots(), threading.Lock()
+
+# Horizontal bar chart as a Vega-Lite spec; the browser renders it, so reruns do no rasterization
+def bar_chart_spec(df, title, x_col, y_col):
+    # Number each label in frame order so rows sharing a game name keep their own bar
+    chart_df = pd.DataFrame({
+        x_col: df[x_col].reset_index(drop=True),
+        y_col: [f"{rank}. {name}" for rank, name in enumerate(df[y_col].astype(str), start=1)],
+    })
+    return alt.Chart(chart_df).mark_bar().encode(
+        x=alt.X(x_col, type='quantitative'),
+        y=alt.Y(y_col, type='nominal', sort=None),  # Keep the frame's order, first row on top
+        color=alt.Color(y_col, type='nominal', sort=None, scale=alt.Scale(scheme='viridis'), legend=None),
+    ).properties(title=title)
+
+# Pie chart of the rating distribution, rasterized once per distinct input
+@st.cache_data(hash_funcs={pd.Series: hash_frame})
+def render_pie_png(ratings, title):
+    rating_counts = ratings.value_counts(sort=False)
+    fig, ax, lock = pie_canvas()
+    with lock:
+        ax.clear()
+        ax.pie(rating_counts.to_numpy(), labels=rating_counts.index.to_numpy(), autopct='%1.1f%%', startangle=140, colors=sns.color_palette('plasma'))
+        ax.set_title(title)
+        return figure_to_png(fig)
+
+# Function to display a bar chart; df is already sliced to the top games
+def create_bar_chart(df, title, x_col, y_col):
+    if df.empty:
+        st.warning(f"No data available for {title}")
+        return
+
+    st.altair_chart(bar_chart_spec(df, title, x_col, y_col), width="stretch")
+
+# Creating pie charts for distribution of ratings; ratings is already sliced to the top games
+def create_pie_chart(ratings, title):
+    if ratings.empty:
+        st.warning(f"No data available for {title}")
+        return
+
+    st.image(render_pie_png(ratings, title), width="stretch")
+
+# Adding interactive filters; as a fragment, changing the selected category reruns
+# only this block and leaves the charts above untouched
+@st.fragment
+def category_filters(data_key, data_df, category_groups, num_games, show_detailed_view):
+    category_options = data_df['Category'].cat.categories.to_numpy()  # O(1) on the categorical column
+    if len(category_options) > 0:
+        category = st.selectbox('Select Category', category_options)
+        filtered_category_df = take_rows(data_df, category_groups.get(category))
+        category_top = top_by_position(data_key, ('category', category), num_games, filtered_category_df)
+    
+        # Displaying detailed tables
+        if show_detailed_view:
+            st.write(f"### Detailed View: {category}")
+            st.dataframe(category_top, width="stretch", hide_index=True, column_order=required_columns)
+    
+        # Creating bar chart for the selected category
+        create_bar_chart(category_top[['Position', 'Game Name']], f'{category}', 'Position', 'Game Name')
+    
+        st.write(f"### Rating Distribution for {category}")
+        create_pie_chart(category_top['Rating'], f'{category} Rating Distribution')
+    else:
+        st.write("No categories available in the selected dataset.")
+
+# Main chart layout; as a fragment, slider moves and checkbox toggles rerun only this block,
+# while loading, validation and category preparation run on full reruns
+@st.fragment
+def charts_block(data_key, data_df, category_groups, bucket_groups, show_detailed_view):
+    # Number of games to display with max set to number of rows in the file; the slider lives
+    # in the fragment (fragments cannot write to the sidebar) so moving it reruns only this block
+    max_games = len(data_df)
+    num_games = st.slider("Select number of top games to display", 5, min(25, max_games), min(10, max_games))
+
+    # Top Free Games and Top Paid Games in the first column
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("### Top Free Games")
+        free_data = take_rows(data_df, bucket_groups.get('free'))
+        free_top = top_by_position(data_key, ('bucket', 'free'), num_games, free_data)
+        create_bar_chart(free_top[['Position', 'Game Name']], 'Top Free Apps', 'Position', 'Game Name')
+
+        st.write("### Top Paid Games")
+        paid_data = take_rows(data_df, bucket_groups.get('paid'))
+        paid_top = top_by_position(data_key, ('bucket', 'paid'), num_games, paid_data)
+        create_bar_chart(paid_top[['Position', 'Game Name']], 'Top Paid Apps', 'Position', 'Game Name')
+
+    # Top Grossing Games and Game Name by Rating in the second column
+    with col2:
+        st.write("### Top Grossing Games")
+        grossing_data = take_rows(data_df, bucket_groups.get('grossing'))
+        grossing_top = top_by_position(data_key, ('bucket', 'grossing'), num_games, grossing_data)
+        create_bar_chart(grossing_top[['Position', 'Game Name']], 'Top Grossing Apps', 'Position', 'Game Name')
+
+        st.write("### Game Name by Rating")
+        create_bar_chart(top_by_rating(data_key, num_games, data_df), 'Game Name by Rating', 'Rating', 'Game Name')
+
+    if show_detailed_view:
+        # Display columns of the uploaded CSV file
+        st.write("### Detailed View all")
+        # Only serialize the full frame to the browser on demand
+        show_all_rows = st.checkbox("Show all rows", False)
+        detail_df = data_df if show_all_rows else data_df.head(num_games)
+        st.dataframe(detail_df, width="stretch", hide_index=True, column_order=required_columns)
+
+    # Adding interactive filters
+    category_filters(data_key, data_df, category_groups, num_games, show_detailed_view)
 
 st.sidebar.write("Top rank data")
 # Sidebar for platform selection
@@ -69,12 +367,17 @@ default_data_df = load_data(region, platform=platform)
 uploaded_file = st.sidebar.file_uploader(f"Choose a CSV file for {region} ({platform})", type="csv")
 
 # Determine which data to use: default or uploaded
+data_key = (region, platform, None)
 if uploaded_file is not None:
-    data_df = pd.read_csv(uploaded_file)
+    uploaded_data = uploaded_file.getvalue()
+    data_df = read_uploaded(uploaded_file.name, uploaded_data)
+    # Key derived caches on the content, so a re-upload under the same name is not served stale rows
+    data_key = (region, platform, hashlib.sha1(uploaded_data).hexdigest())
     st.sidebar.success("CSV file successfully uploaded.")
     use_uploaded = st.sidebar.radio("Select Data Source", ['Use Uploaded File', 'Use Default File'])
     if use_uploaded == 'Use Default File' and not default_data_df.empty:
         data_df = default_data_df
+        data_key = (region, platform, None)
 else:
     if not default_data_df.empty:
         data_df = default_data_df
@@ -90,110 +393,16 @@ if not data_df.empty:
 # Option to show/hide detailed view
 show_detailed_view = st.sidebar.checkbox("Show Detailed View", True)
 
-# Check if the necessary columns exist
-required_columns = ['Category', 'Game Name', 'Rating', 'Position']
-if not all(col in data_df.columns for col in required_columns):
-    st.error(f"CSV file does not contain required columns: {', '.join(required_columns)}.")
+# Columns are validated at load time, so an empty frame means there is nothing to show
+if data_df.empty:
+    st.error(f"No data with the required columns ({', '.join(required_columns)}) is available.")
 else:
-    # Sidebar for number of games to display with max set to number of rows in the file
-    max_games = len(data_df)
-    st.sidebar.title("Select number of top games to display")
-    num_games = st.sidebar.slider("Select number of top games to display", 5, min(25, max_games), min(10, max_games))
-
-    # Function to create bar charts using Seaborn with dark theme
-    def create_bar_chart(df, title, x_col, y_col):
-        if df.empty:
-            st.warning(f"No data available for {title}")
-            return
-        
-        plt.figure(figsize=(10, 6))
-        sns.set(style="darkgrid")
-        sns.set_palette("viridis")
-        ax = sns.barplot(x=x_col, y=y_col, data=df.head(num_games), palette='viridis')
-        ax.set_facecolor('#303030')
-        plt.title(title, color='white')
-        plt.xlabel(x_col, color='white')
-        plt.ylabel(y_col, color='white')
-        plt.xticks(color='white')
-        plt.yticks(color='white')
-        plt.gca().patch.set_facecolor('#303030')
-        plt.gcf().set_facecolor('#303030')
-        st.pyplot(plt)
-
-    # Function to filter data by multiple possible category names
-    def filter_data_by_category(df, categories):
-        return df[df['Category'].isin(categories)]
-    
+    # Cached row positions for this dataset
+    category_groups, bucket_groups = prepare_data(data_key, data_df)
+
     # Streamlit app layout
     st.title(f'Top {platform} Ranked Games by Category in {region}')
-
-    # Define possible categories
-    free_categories = ['Top Free Games', 'Free', 'Top Free']
-    paid_categories = ['Top Paid Games', 'Paid', 'Top Paid' ]
-    grossing_categories = ['Top Grossing Games', 'Grossing', 'Top Grossing']
-
-    # Top Free Games and Top Paid Games in the first column
-    col1, col2 = st.columns(2)
-    with col1:
-        st.write("### Top Free Games")
-        free_data = filter_data_by_category(data_df, free_categories)
-        create_bar_chart(free_data, 'Top Free Apps', 'Position', 'Game Name')
-
-        st.write("### Top Paid Games")
-        paid_data = filter_data_by_category(data_df, paid_categories)
-        create_bar_chart(paid_data, 'Top Paid Apps', 'Position', 'Game Name')
-
-    # Top Grossing Games and Game Name by Rating in the second column
-    with col2:
-        st.write("### Top Grossing Games")
-        grossing_data = filter_data_by_category(data_df, grossing_categories)
-        create_bar_chart(grossing_data, 'Top Grossing Apps', 'Position', 'Game Name')
-
-        st.write("### Game Name by Rating")
-        create_bar_chart(data_df, 'Game Name by Rating', 'Rating', 'Game Name')
-
-    if show_detailed_view:
-        # Display columns of the uploaded CSV file
-        st.write("### Detailed View all")
-        st.dataframe(data_df)
-
-    # Adding interactive filters
-    category_options = data_df['Category'].unique()
-    if len(category_options) > 0:
-        category = st.selectbox('Select Category', category_options)
-        filtered_category_df = data_df[data_df['Category'] == category]
-        
-        # Displaying detailed tables
-        if show_detailed_view:
-            st.write(f"### Detailed View: {category}")
-            st.dataframe(filtered_category_df.head(num_games))
-        
-        # Creating bar chart for the selected category
-        create_bar_chart(filtered_category_df, f'{category}', 'Position', 'Game Name')
-        
-        # Creating pie charts for distribution of ratings
-        def create_pie_chart(df, title):
-            if df.empty:
-                st.warning(f"No data available for {title}")
-                return
-            
-            rating_counts = df['Rating'].value_counts()
-            plt.figure(figsize=(8, 8))
-            plt.pie(rating_counts, labels=rating_counts.index, autopct='%1.1f%%', startangle=140, colors=sns.color_palette('plasma'))
-            plt.title(title, color='white')
-            plt.gca().patch.set_facecolor('#303030')
-            plt.gcf().set_facecolor('#303030')
-            for text in plt.gca().texts:
-                text.set_color('white')  # Set pie chart text color to white
-            # Adjust the color of the outer labels
-            for text in plt.gca().texts[-len(rating_counts):]:
-                text.set_color('white')
-            st.pyplot(plt)
-        
-        st.write(f"### Rating Distribution for {category}")
-        create_pie_chart(filtered_category_df.head(num_games), f'{category} Rating Distribution')
-    else:
-        st.write("No categories available in the selected dataset.")
+    charts_block(data_key, data_df, category_groups, bucket_groups, show_detailed_view)
 
 st.info("build by dw v1 8/19/24")
 st.success("Data successfully loaded from the first available file")